@@ -1,9 +1,75 @@
-import urllib.request
+import urllib.error
 import urllib.parse
+import http.client
+import threading
+import time
 import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from mundipy.geometry import loads, Point, dumps
 
+MAPBOX_HOST = 'api.mapbox.com'
+
+# one keep-alive connection per thread, reused across requests
+_connections = threading.local()
+
+# Mapbox rate limits the Isochrone API to 300 requests per minute
+MAPBOX_RATE_LIMIT = 300
+MAPBOX_RATE_WINDOW = 60.0
+
+# start times of requests in the last window, shared by all threads
+_request_times = deque()
+_request_times_lock = threading.Lock()
+
+def _throttle():
+	""" Block until another request fits in the Mapbox rate limit. """
+	while True:
+		with _request_times_lock:
+			now = time.monotonic()
+			while len(_request_times) > 0 and now - _request_times[0] >= MAPBOX_RATE_WINDOW:
+				_request_times.popleft()
+
+			if len(_request_times) < MAPBOX_RATE_LIMIT:
+				_request_times.append(now)
+				return
+
+			wait = MAPBOX_RATE_WINDOW - (now - _request_times[0])
+
+		time.sleep(wait)
+
+def _mapbox_get(path, params):
+	""" GET a path from the Mapbox API over a persistent HTTPS connection. """
+	url = path + "?" + urllib.parse.urlencode(params)
+
+	# retry once on a fresh connection, e.g. if the server closed the old one
+	for attempt in range(2):
+		conn = getattr(_connections, 'conn', None)
+		if conn is None:
+			conn = http.client.HTTPSConnection(MAPBOX_HOST, timeout=10)
+			_connections.conn = conn
+
+		_throttle()
+
+		try:
+			conn.request('GET', url)
+			response = conn.getresponse()
+			response_data = response.read()
+			break
+		except Exception as e:
+			# a failed request leaves the connection unusable, so never
+			# reuse it on this thread
+			conn.close()
+			_connections.conn = None
+			if attempt == 1 or not isinstance(e, (http.client.HTTPException, OSError)):
+				raise
+
+	if response.status != 200:
+		raise urllib.error.HTTPError('https://%s%s' % (MAPBOX_HOST, path), response.status,
+			response.reason, response.headers, None)
+
+	return response_data
+
 def isochrone(pt, radius: float, units: str, accessToken=None):
 	""" Calculate an isochrone via the Mapbox API. """
 	if accessToken is None:
@@ -11,7 +77,8 @@ def isochrone(pt, radius: float, units: str, accessToken=None):
 	if not isinstance(pt, Point):
 		raise TypeError('mundipy.api.isochrone expects pt to be mundipy.geometry.Point, got %s' % type(pt))
 
-	url = "https://api.mapbox.com/isochrone/v1/mapbox/driving/%f%%2C%f" % (pt.x, pt.y)
+	# fixed point to ~1mm, repr() of small floats is scientific (1e-05)
+	path = "/isochrone/v1/mapbox/driving/%.8f%%2C%.8f" % (pt.x, pt.y)
 	params = {
 		"polygons": "true",
 		"denoise": 1,
@@ -25,8 +92,17 @@ def isochrone(pt, radius: float, units: str, accessToken=None):
 	else:
 		raise TypeError('unknown unit "%s" passed to mundipy.api.isochrone (need minutes or meters)' % units)
 
-	response = urllib.request.urlopen(url + "?" + urllib.parse.urlencode(params))
-	response_data = response.read().decode('utf-8')
+	# gives FeatureCollection, json.loads decodes the UTF-8 bytes itself
+	return loads(json.loads(_mapbox_get(path, params)))[0]
+
+def isochrones(pts, radius: float, units: str, accessToken=None, max_workers=8):
+	"""
+	Calculate isochrones for many points via the Mapbox API, in parallel.
+
+	Requests are throttled to MAPBOX_RATE_LIMIT per minute.
+	"""
+	if not isinstance(max_workers, int) or max_workers < 1:
+		raise TypeError('mundipy.api.isochrones expects max_workers to be a positive int')
 
-	# gives FeatureCollection
-	return loads(json.loads(response_data))[0]
+	with ThreadPoolExecutor(max_workers=max_workers) as pool:
+		return list(pool.map(lambda pt: isochrone(pt, radius, units, accessToken=accessToken), pts))
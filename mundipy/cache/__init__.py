@@ -3,13 +3,34 @@ mundipy.cache provides spatial caches as function decorators.
 """
 
 from functools import lru_cache
+from collections import OrderedDict
+from itertools import count
 from shapely.geometry.base import BaseGeometry
+from shapely.geometry import box, Polygon
+from shapely import STRtree
+import shapely
 import pyproj
 import inspect
+import weakref
+
+def crs_key(crs):
+    """ Normalize a CRS given as an EPSG code or 'epsg:xxxx' string to 'EPSG:xxxx'. """
+    if isinstance(crs, int):
+        return 'EPSG:%d' % crs
+
+    if isinstance(crs, str) and crs[:5].upper() == 'EPSG:':
+        return 'EPSG:' + crs[5:]
+
+    return crs
 
-@lru_cache(maxsize=64)
 def pyproj_transform(from_crs, to_crs):
     """ Returns a pyproj transform() function between two CRS, in 'EPSG:xxxx' format."""
+    return _pyproj_transform(crs_key(from_crs), crs_key(to_crs))
+
+# building a Transformer reads the PROJ database, and Transformers are
+# small, so keep plenty of them around
+@lru_cache(maxsize=512)
+def _pyproj_transform(from_crs, to_crs):
     return pyproj.Transformer.from_crs(pyproj.CRS(from_crs),
         pyproj.CRS(to_crs), always_xy=True).transform
 
@@ -18,7 +39,9 @@ def union_spatial_cache(fn, maxsize=128):
 	This decorator caches a function based on area containment calculations.
 	For example, if a function returns geometries of objects that are
 	contained by an area, adding @union_spatial_cache will cache the results
-	based on area and PCS. Subsequent calls will use the cache to reduce
+	based on area, PCS and the other positional arguments. Methods are
+	cached per instance.
+	Subsequent calls will use the cache to reduce
 	the area the function must be called on, and the decorator will join
 	the arrays.
 
@@ -28,12 +51,24 @@ def union_spatial_cache(fn, maxsize=128):
 	The function must return an array of mundipy geometries.
 	"""
 
-	# ((shape, pcs), df)
-	cache = []
+	keys = count()
 
-	def check_cache_first(*args, **kwargs):
-		nonlocal cache
+	def new_state():
+		return {
+			# key -> (shape, (pcs, other args), df), least recently used first
+			'cache': OrderedDict(),
+			# cache keys in the same order as the STRtree geometries
+			'tree_keys': [],
+			'tree': STRtree([])
+		}
+
+	# methods get a cache per instance, held weakly so the cache never
+	# keeps an instance (like a Dataset with open files) alive
+	fn_is_method = inspect.getfullargspec(fn)[0][:1] == ['self']
+	instance_states = weakref.WeakKeyDictionary()
+	shared_state = new_state()
 
+	def check_cache_first(*args, **kwargs):
 		if len(args) == 0:
 			raise TypeError('union_spatial_cache fn must be passed >= 1 argument')
 		geom = args[-1]
@@ -45,24 +80,40 @@ def union_spatial_cache(fn, maxsize=128):
 		if not isinstance(geom, BaseGeometry):
 			raise TypeError('last argument to union_spatial_cache fn is neither None nor shapely.geometry')
 
-		# get pcs
+		# get pcs, results are only shared between calls with the
+		# same pcs and other arguments
 		pcs = kwargs['pcs'] if 'pcs' in kwargs else 'EPSG:4326'
-
-		# get all cache items that intersect and have same pcs
-		# by default they will be sorted by area
-		cached_dfs = filter(lambda c: c[0][1] == pcs and c[0][0].intersects(geom), cache)
+		if fn_is_method and len(args) > 1:
+			state = instance_states.get(args[0])
+			if state is None:
+				state = instance_states[args[0]] = new_state()
+			scope = (pcs, args[1:-1])
+		else:
+			state = shared_state
+			scope = (pcs, args[:-1])
+
+		cache = state['cache']
+		tree_keys = state['tree_keys']
+		tree = state['tree']
+
+		# get all cache items that intersect and have the same scope,
+		# sorted by area so largest area is first
+		hits = [ tree_keys[i] for i in tree.query(geom, predicate='intersects') ]
+		hits = sorted(filter(lambda k: cache[k][1] == scope, hits), reverse=True, key=lambda k: cache[k][0].area)
+		cached_dfs = []
+		for key in hits:
+			cache.move_to_end(key)
+			cached_dfs.append((cache[key][0], cache[key][2]))
 
 		# find remaining area
 		remaining_area = geom
 		all_dfs = []
-		for details, df in cached_dfs:
-			cached_geom, _ = details
-
+		for cached_geom, df in cached_dfs:
 			# if remaining_area covers cached_geom, we can put the entire DF
 			# in, saving intersection calculations
 			# get intersection
 			if remaining_area.covers(cached_geom):
-				all_dfs.append(df)
+				all_dfs.append((cached_geom, df))
 			else:
 				# fraction of df will be relevant in intersected area
 				intersecting_area = cached_geom.intersection(remaining_area)
@@ -74,7 +125,13 @@ def union_spatial_cache(fn, maxsize=128):
 				# some returned points from the function might be mundipy geometries
 				intersecting_df = list(filter(lambda g: (g._geo if not isinstance(g, BaseGeometry) else g).intersects(intersecting_area), df))
 
-				all_dfs.append(intersecting_df)
+				all_dfs.append((intersecting_area, intersecting_df))
+
+			# fast path: cached_geom covers the envelope of what's left,
+			# so there is nothing left and we can skip the difference
+			if cached_geom.covers(box(*remaining_area.bounds)):
+				remaining_area = Polygon()
+				break
 
 			# subtract from remaining
 			remaining_area = remaining_area.difference(cached_geom)
@@ -87,17 +144,60 @@ def union_spatial_cache(fn, maxsize=128):
 		if remaining_area.area > 0.0:
 			result = fn(*args[:-1], remaining_area, **kwargs)
 
-			all_dfs.append(result)
+			all_dfs.append((remaining_area, result))
+
+			# result only covers the area fn was called on, the rest
+			# came from other cache entries
+			cache[next(keys)] = (remaining_area, scope, result)
+			if len(cache) > maxsize:
+				cache.popitem(last=False)
+
+			# STRtree is immutable, rebuild with the new footprints
+			state['tree_keys'] = list(cache.keys())
+			state['tree'] = STRtree([ cache[k][0] for k in state['tree_keys'] ])
 
-			# re-order cache list to include the new hit
-			# sort by area so largest area is first
-			cache = sorted([((geom, pcs), result)] + cache[:maxsize-1], reverse=True, key=lambda c: c[0][0].area)
+		if len(all_dfs) == 1:
+			return list(all_dfs[0][1])
 
-		# TODO drop duplicates
-		return [item for sublist in all_dfs for item in sublist]
+		# features straddling the edge of a cached area were loaded
+		# by both calls, so keep only their first copy
+		return drop_duplicates(all_dfs)
 
 	return check_cache_first
 
+def feature_key(item):
+	"""Identify a shapely or mundipy geometry by its geometry and features."""
+	if isinstance(item, BaseGeometry):
+		return (item.wkb, None)
+
+	# read values straight from the batch, without building a dict
+	if item._batch is not None:
+		return (item._geo.wkb, repr(tuple(values[item._row] for values in item._batch.columns.values())))
+
+	return (item._geo.wkb, repr(item.features))
+
+def drop_duplicates(dfs):
+	"""
+	Concatenate (footprint, geometries) lists, dropping geometries
+	already in an earlier list. Duplicates within one list are kept.
+
+	Footprints don't overlap, so a geometry lying properly inside its
+	own footprint can't be in another list. Only the geometries that
+	cross a footprint's boundary are compared.
+	"""
+	seen = set()
+	out = []
+	for footprint, df in dfs:
+		geoms = [ g._geo if not isinstance(g, BaseGeometry) else g for g in df ]
+		shapely.prepare(footprint)
+		inside = shapely.contains_properly(footprint, geoms)
+
+		keys = [ None if is_inside else feature_key(item) for item, is_inside in zip(df, inside) ]
+		out.extend(item for item, key in zip(df, keys) if key is None or key not in seen)
+		seen.update(key for key in keys if key is not None)
+
+	return out
+
 def spatial_cache_footprint(fn, maxsize=128):
 	"""
 	Cache this function for all geometries that fit within the returned
@@ -111,8 +211,12 @@ def spatial_cache_footprint(fn, maxsize=128):
 	Function must return (result, footprint). If footprint is None,
 	the result will not be cached.
 	"""
-	# list of (shape, result)
-	cache = []
+	# key -> (result, shape), least recently used first
+	cache = OrderedDict()
+	keys = count()
+	# cache keys in the same order as the STRtree geometries
+	tree_keys = []
+	tree = STRtree([])
 
 	cache_info = {
 		'hits': 0,
@@ -121,27 +225,29 @@ def spatial_cache_footprint(fn, maxsize=128):
 
 	# https://stackoverflow.com/questions/218616/how-to-get-method-parameter-names
 	fn_is_method = inspect.getfullargspec(fn)[0][0] == 'self'
+	# index of the geometry argument, after self for methods
+	shape_idx = 1 if fn_is_method else 0
 
 	def check_cache_first(*args, **kwargs):
-		nonlocal cache
+		nonlocal tree_keys, tree
 
-		if not fn_is_method and len(args) < 1:
-			raise TypeError('zero args passed to function expecting one (spatial_cache_footprint)')
-		elif not fn_is_method and (args[0] is not None and not isinstance(args[0], BaseGeometry)):
-			raise TypeError('first arg passed to spatial_cache_footprint is not a shapely BaseGeometry, or None')
-		if fn_is_method and len(args) < 2:
+		if len(args) <= shape_idx:
 			raise TypeError('zero args passed to function expecting one (spatial_cache_footprint)')
-		elif fn_is_method and (args[1] is not None and not isinstance(args[1], BaseGeometry)):
+
+		shape = args[shape_idx]
+		if shape is not None and not isinstance(shape, BaseGeometry):
 			raise TypeError('first arg passed to spatial_cache_footprint is not a shapely BaseGeometry, or None')
 
-		shape = args[1 if fn_is_method else 0]
 		# only check cache if shape is not None
 		if shape is not None:
-			for cache_item in cache:
-				# cache hit
-				if cache_item[1].contains(shape):
-					cache_info['hits'] += 1
-					return cache_item[0]
+			# footprints that contain shape, i.e. shape is within them
+			hits = tree.query(shape, predicate='within')
+			# cache hit, prefer the most recently inserted footprint
+			if hits.size > 0:
+				key = max(tree_keys[i] for i in hits)
+				cache.move_to_end(key)
+				cache_info['hits'] += 1
+				return cache[key][0]
 
 		# cache miss
 		cache_info['misses'] += 1
@@ -152,8 +258,13 @@ def spatial_cache_footprint(fn, maxsize=128):
 		res, footprint = out
 
 		if footprint is not None:
-			# re-order cache list to include the new hit
-			cache = [(res, footprint)] + cache[:maxsize-1]
+			cache[next(keys)] = (res, footprint)
+			if len(cache) > maxsize:
+				cache.popitem(last=False)
+
+			# STRtree is immutable, rebuild with the new footprints
+			tree_keys = list(cache.keys())
+			tree = STRtree([ cache[k][1] for k in tree_keys ])
 
 		return res
 
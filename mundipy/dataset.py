@@ -11,37 +11,118 @@ over features in a dataset.
 
 from shapely.geometry.base import BaseGeometry
 from shapely.geometry import box, shape, Point, Polygon, MultiPolygon
+import numpy as np
 import shapely.wkt
 import shapely.wkb
 from shapely.ops import transform
-from functools import lru_cache, partial
+from shapely import STRtree, GEOSException, make_valid
+from functools import partial
+import threading
+import math
 import psycopg
+from psycopg import sql
 import fiona
 from psycopg_pool import ConnectionPool
 
+# optional, pyogrio reads whole columns through GDAL instead of
+# building a dict per feature like fiona
+try:
+	import pyogrio.raw
+except ImportError:
+	pyogrio = None
+
 from mundipy.cache import (spatial_cache_footprint, pyproj_transform,
 	union_spatial_cache)
-from mundipy.geometry import enrich_geom
+from mundipy.geometry import enrich_geom, enrich_batch, FeatureBatch, transform_coords
 import mundipy.geometry as mgeom
 
+# points have empty bboxes, so intersects() buffers them by an ~inch
+POINT_BUFFER = 1e-3
+
+# KNN candidates that Dataset.nearest re-ranks on the spheroid in PostGIS
+NEAREST_CANDIDATES = 100
+
+# rows parsed at a time by elements_from_cursor
+FETCH_SIZE = 10000
+
 def elements_from_cursor(cur):
 	# get column names
 	colnames = [desc[0] for desc in cur.description]
+	geom_idx = colnames.index('geometry')
 
-	return [ element_from_tuple(tup, colnames) for tup in cur.fetchall() ]
+	# parse in chunks, so only one chunk of row tuples is alive at once
+	out = []
+	while True:
+		rows = cur.fetchmany(FETCH_SIZE)
+		if len(rows) == 0:
+			break
 
-def element_from_tuple(tup, colnames):
-	features = dict()
-	geom = None
+		# transpose rows into columns
+		columns = list(zip(*rows))
+		del rows
 
-	for i, val in enumerate(tup):
-		# comes as WKB encoded
-		if colnames[i] == 'geometry':
-			geom = shapely.wkb.loads(bytes.fromhex(val))
-		else:
-			features[colnames[i]] = val
+		# comes as hex EWKB, parse the whole column at once
+		geoms = shapely.from_wkb(columns[geom_idx])
+
+		batch = FeatureBatch({ name: columns[i] for i, name in enumerate(colnames) if i != geom_idx })
+
+		out.extend(enrich_batch(geoms, batch))
+
+	return out
+
+def pyogrio_values(values, dtype):
+	"""
+	Convert a pyogrio field array to a list of Python values, as fiona
+	gives them. Nulls become None rather than NaN, and integer or bool
+	fields that pyogrio widened to float to hold NaN are narrowed back.
+	"""
+	values = values.tolist()
+	if not any(isinstance(v, float) and math.isnan(v) for v in values):
+		return values
+
+	if dtype.startswith(('int', 'uint')):
+		return [ None if math.isnan(v) else int(v) for v in values ]
+	if dtype == 'bool':
+		return [ None if math.isnan(v) else bool(v) for v in values ]
+
+	return [ None if isinstance(v, float) and math.isnan(v) else v for v in values ]
+
+def as_wgs84(geom):
+	"""Get a shapely geometry in WGS84 from a shapely or mundipy geometry."""
+	if isinstance(geom, mgeom.BaseGeometry):
+		return geom.as_shapely('EPSG:4326')
+
+	return geom
+
+def search_bbox(query, radius, projection):
+	"""
+	The WGS84 bbox of everything within radius of query, a shapely
+	geometry in projection.
+	"""
+	minx, miny, maxx, maxy = query.bounds
+	zone = box(minx - radius, miny - radius, maxx + radius, maxy + radius)
+
+	# densify the edges so the bbox still covers the zone after
+	# reprojecting to WGS84
+	span = max(maxx - minx, maxy - miny, radius)
+	if span > 0:
+		zone = shapely.segmentize(zone, span / 8)
 
-	return enrich_geom(geom, features)
+	return transform_coords(zone, pyproj_transform(projection, 'EPSG:4326')).bounds
+
+def projected_distances(items, query, projection):
+	"""
+	Distances from mundipy geometries to query, a shapely geometry,
+	measured in projection with one vectorized call.
+	"""
+	geoms = np.array([ as_wgs84(g) for g in items ], dtype=object)
+	geoms = transform_coords(geoms, pyproj_transform('EPSG:4326', projection))
+
+	return shapely.distance(geoms, query)
+
+def feature_index(items):
+	"""Build an STRtree over a list of mundipy geometries in WGS84."""
+	return STRtree([ as_wgs84(g) for g in items ])
 
 class Dataset:
 	"""
@@ -59,6 +140,16 @@ class Dataset:
 	def __init__(self, data):
 		""" Initialize a Dataset from a data source. """
 
+		# opened lazily by _get_pool() and _fiona
+		self._pool = None
+		# fiona collections can't be read from two threads at once, so
+		# each thread opens its own. All are kept so close() reaches them
+		self._fiona_local = threading.local()
+		self._fiona_collections = []
+		self._fiona_lock = threading.Lock()
+		# set by geometry_collection() and _collection_index()
+		self._collection = None
+		self._collection_tree = None
 		self.filename = None
 		self._db_url = None
 		self._db_table = None
@@ -71,10 +162,99 @@ class Dataset:
 		else:
 			raise TypeError('data for Dataset() is neither filename nor dict with PostgreSQL details')
 
+	def _get_pool(self):
+		"""Lazily create the PostgreSQL connection pool, reused across loads."""
+		if self._pool is None:
+			# 3 second timeout. Open and warm the pool now so the first
+			# query doesn't pay for connecting, and fails early if the
+			# database is unreachable
+			pool = ConnectionPool(self._db_url, timeout=3.0, min_size=4, max_size=16, open=True)
+			try:
+				pool.wait(timeout=5.0)
+			except Exception:
+				# don't leave the pool's workers retrying in the background
+				pool.close()
+				raise
+
+			self._pool = pool
+
+		return self._pool
+
+	@property
+	def _table_identifier(self):
+		# allow schema qualified tables, like schema.table
+		return sql.Identifier(*self._db_table.split('.'))
+
+	def _select(self, suffix, params=None, stream=False):
+		"""
+		SELECT * from the PostGIS table, followed by an SQL suffix.
+
+		With stream=True, rows are read through a server-side cursor
+		FETCH_SIZE at a time, instead of the whole result set at once.
+		"""
+		query = sql.SQL("SELECT * FROM {} ").format(self._table_identifier) + sql.SQL(suffix)
+
+		return self._query(query, params, stream=stream)
+
+	def _query(self, query, params=None, stream=False):
+		"""Run a composed query, returning its rows as mundipy geometries."""
+		with self._get_pool().connection() as conn:
+			if stream:
+				with conn.cursor('mundipy_select') as cur:
+					cur.execute(query, params)
+					return elements_from_cursor(cur)
+
+			# text results, psycopg has no binary loader for many column
+			# types (enums, citext, extensions) and would give them as bytes
+			with conn.cursor() as cur:
+				# the query text only varies by table, so have the server
+				# keep its plan rather than re-planning every bbox load
+				cur.execute(query, params, prepare=True)
+				return elements_from_cursor(cur)
+
 	@property
-	def _pool(self):
-		# 3 second timeout
-		return ConnectionPool(self._db_url, timeout=3.0, min_size=1, max_size=1)
+	def _fiona(self):
+		"""Lazily open this thread's fiona collection, reused across loads."""
+		collection = getattr(self._fiona_local, 'collection', None)
+		if collection is None or collection.closed:
+			collection = self._fiona_local.collection = fiona.open(self.filename)
+			with self._fiona_lock:
+				self._fiona_collections.append(collection)
+
+		return collection
+
+	def close(self):
+		"""
+		Close the PostgreSQL connection pool or file, if one was opened,
+		and drop the in-memory geometry collection and its index.
+		"""
+		if self._pool is not None:
+			self._pool.close()
+			self._pool = None
+		with self._fiona_lock:
+			for collection in self._fiona_collections:
+				collection.close()
+			self._fiona_collections = []
+
+		self._collection = None
+		self._collection_tree = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def __del__(self):
+		# can run at interpreter exit or on a partly constructed Dataset,
+		# so never raise, nor wait on the pool's workers to stop
+		try:
+			if self._pool is not None:
+				self._pool.close(timeout=0)
+				self._pool = None
+			self.close()
+		except Exception:
+			pass
 
 	@union_spatial_cache
 	def _load(self, geom):
@@ -88,39 +268,91 @@ class Dataset:
 		"""
 
 		if self._db_url is not None:
-			with self._pool.connection() as conn:
-				cur = conn.execute("SELECT * FROM %s" % self._db_table)
-
-				# no geom
-				if geom is None:
-					# build the query
-					query = "SELECT * FROM %s" % self._db_table
-				else:
-					# load entire geometry
-					query = "SELECT * FROM %s WHERE geometry && ST_GeomFromEWKT('SRID=4326;%s')" % (self._db_table, geom.wkt)
+			# no geom
+			if geom is None:
+				return self._select("", stream=True)
 
-				return elements_from_cursor(conn.execute(query))
+			# ST_Intersects uses the GiST index on the geometry column, and
+			# unlike && doesn't return features whose envelope merely overlaps
+			return self._select("WHERE ST_Intersects(geometry, ST_GeomFromWKB(%s, 4326))", (shapely.wkb.dumps(geom),))
 
-		f = fiona.open(self.filename)
+		if pyogrio is not None:
+			return self._read_pyogrio(geom)
 
+		# values() streams features rather than materializing them
 		if geom is None:
-			items = f.values()
+			items = self._fiona.values()
 		else:
-			items = f.values(bbox=geom.bounds)
+			items = self._fiona.values(bbox=geom.bounds)
 
 		return [ enrich_geom(shape(item['geometry']), dict(item['properties'])) for item in items ]
 
-	@lru_cache(maxsize=8)
+	def _read_pyogrio(self, geom):
+		"""Read the file with pyogrio, parsing all geometries in one call."""
+		meta, _, geometry, field_data = pyogrio.raw.read(self.filename,
+			bbox=None if geom is None else geom.bounds,
+			# fiona gives datetimes as strings too
+			datetime_as_string=True)
+
+		batch = FeatureBatch({ name: pyogrio_values(values, dtype) for name, values, dtype in zip(meta['fields'], field_data, meta['dtypes']) })
+
+		return enrich_batch(shapely.from_wkb(geometry), batch)
+
 	def geometry_collection(self):
-		return self._load(None)
+		if self._collection is None:
+			self._collection = self._load(None)
+
+		return self._collection
+
+	def _collection_index(self):
+		"""STRtree over geometry_collection(), in the same order."""
+		if self._collection_tree is None:
+			self._collection_tree = feature_index(self.geometry_collection())
+
+		return self._collection_tree
 
 	"""Read into a Dataset at a specific geometry (WGS84)."""
 	def inside_bbox(self, bbox):
 		if not isinstance(bbox, tuple) or len(bbox) != 4:
 			raise TypeError('inside_bbox expected bbox to be a 4-tuple')
 
+		# once everything is in memory, answer from its STRtree rather
+		# than reading the source again. Like fiona's bbox filter, this
+		# matches features whose envelope intersects the bbox
+		if self._collection is not None:
+			items = self._collection
+			return [ items[i] for i in sorted(self._collection_index().query(box(*bbox))) ]
+
 		return self._load(box(*bbox))
 
+	def inside_bbox_projected(self, bbox, crs):
+		"""
+		Like inside_bbox, but returns geometries already in `crs`.
+
+		All geometries are reprojected together with one pyproj call,
+		rather than one per geometry on first use.
+		"""
+		items = self.inside_bbox(bbox)
+		if len(items) == 0:
+			return []
+
+		wgs84 = np.array([ as_wgs84(g) for g in items ], dtype=object)
+		geoms = transform_coords(wgs84, pyproj_transform('EPSG:4326', crs))
+
+		# we already have WGS84 geometries, so fill in fast_bounds for
+		# every projected geometry with one shapely call instead of
+		# transforming corners back geometry by geometry
+		bounds = shapely.bounds(wgs84).tolist()
+
+		out = []
+		for geo, item, fast_bounds in zip(geoms, items, bounds):
+			projected = enrich_geom(geo, item.features, pcs=crs)
+			projected._fast_bounds = tuple(fast_bounds)
+
+			out.append(projected)
+
+		return out
+
 	def __iter__(self):
 		"""
 		Iterate through all items of the dataset.
@@ -129,16 +361,18 @@ class Dataset:
 
 	def __len__(self):
 		if self.filename is None:
-			raise NotImplementedError('Dataset.__len__ not implemented for PostGIS tables')
+			with self._get_pool().connection() as conn:
+				query = sql.SQL("SELECT COUNT(*) FROM {}").format(self._table_identifier)
+				return conn.execute(query).fetchone()[0]
 
-		return len(fiona.open(self.filename))
+		return len(self._fiona)
 
 	@property
 	def bounds(self):
 		if self.filename is None:
 			raise NotImplementedError('Dataset.bounds not implemented for PostGIS table')
 
-		return fiona.open(self.filename).bounds
+		return self._fiona.bounds
 
 	def intersects(self, geom):
 		"""
@@ -152,14 +386,42 @@ class Dataset:
 		for feat in layer.intersects(Point(-37.0, 42.1)):
 			plot(feat)
 		"""
-		if not isinstance(geom, BaseGeometry) and not isinstance(geom, mgeom.BaseGeometry):
+		if not isinstance(geom, (BaseGeometry, mgeom.BaseGeometry)):
 			raise TypeError('geom is neither shapely.geometry nor mundipy.geometry')
 
-		# buffer by an ~inch to prevent point
-		bbox = (geom.buffer(1e-3) if isinstance(geom, Point) or isinstance(geom, mgeom.Point) else geom).bounds
+		# buffer to prevent point
+		bbox = (geom.buffer(POINT_BUFFER) if isinstance(geom, (Point, mgeom.Point)) else geom).bounds
 
+		# inside_bbox already prunes by bounding box, from the source's
+		# spatial filter or the in-memory STRtree, so only exact checks remain
 		potentially_intersecting = self.inside_bbox(bbox)
-		return list(filter(lambda g: g.intersects(geom), potentially_intersecting))
+		if len(potentially_intersecting) == 0:
+			return []
+
+		# project everything into one PCS covering all candidates, then
+		# check them all with a single vectorized GEOS call
+		candidates = np.array([ as_wgs84(g) for g in potentially_intersecting ], dtype=object)
+		query = as_wgs84(geom)
+
+		minx, miny, maxx, maxy = shapely.total_bounds(candidates)
+		qminx, qminy, qmaxx, qmaxy = query.bounds
+		projection = mgeom.pcs_for_bounds((min(minx, qminx), min(miny, qminy), max(maxx, qmaxx), max(maxy, qmaxy)))
+
+		transformer = pyproj_transform('EPSG:4326', projection)
+		candidates = transform_coords(candidates, transformer)
+		query = transform_coords(query, transformer)
+
+		# the one query geometry is tested against every candidate, so
+		# prepare it once. GEOS only uses the first argument's prepared form
+		shapely.prepare(query)
+
+		try:
+			mask = shapely.intersects(query, candidates)
+		except GEOSException:
+			# as with mundipy geometries, repair invalid geometries lazily
+			mask = shapely.intersects(make_valid(query), make_valid(candidates))
+
+		return [ g for g, hit in zip(potentially_intersecting, mask) if hit ]
 
 	def within(self, radius, geom):
 		"""
@@ -171,10 +433,18 @@ class Dataset:
 		if not isinstance(radius, float) and not isinstance(radius, int):
 			raise TypeError('radius passed to within() is neither float nor int')
 
-		# buffer to create intersection zone
-		zone = geom.buffer(radius)
+		# compare distances in the PCS of geom, rather than building
+		# a buffer polygon and intersecting with it
+		projection = geom._default_pcs
+		query = geom.as_shapely(projection)
+
+		potentially_within = self.inside_bbox(search_bbox(query, radius, projection))
+		if len(potentially_within) == 0:
+			return []
+
+		mask = projected_distances(potentially_within, query, projection) <= radius
 
-		return self.intersects(zone)
+		return [ g for g, hit in zip(potentially_within, mask) if hit ]
 
 	def nearest(self, geom):
 		"""
@@ -188,33 +458,56 @@ class Dataset:
 		if not isinstance(geom, BaseGeometry) and not isinstance(geom, mgeom.BaseGeometry):
 			raise TypeError('geom is neither shapely.geometry nor mundipy.geometry')
 
-		# increasing look outside of this bbox for the nearest item
-		buffer_distances = [1e3, 1e4, 1e5, 1e6, 1e7, 1e8]
-		for buffer_size in buffer_distances:
-			# buffer geom.bbox
-			bbox = geom.buffer(buffer_size).bounds
+		# <-> and STRtree.nearest rank by planar distance in degrees,
+		# which is wrong away from the equator, so only use them to
+		# narrow down the candidates
+		if self._db_url is not None:
+			# rank the KNN candidates by distance on the spheroid
+			query = sql.SQL("SELECT * FROM (SELECT * FROM {} ORDER BY geometry <-> ST_GeomFromWKB(%s, 4326) LIMIT {}) AS candidates "
+				"ORDER BY ST_Distance(geometry::geography, ST_GeomFromWKB(%s, 4326)::geography) LIMIT 1").format(
+				self._table_identifier, sql.Literal(NEAREST_CANDIDATES))
+
+			wkb = shapely.wkb.dumps(as_wgs84(geom))
+			items = self._query(query, (wkb, wkb))
 
-			items = self.inside_bbox(bbox)
-			if len(items) > 0:
-				return min(items, key=lambda geo: geom.distance(geo))
+			return items[0] if len(items) > 0 else None
 
-		# fuck it, check the whole dataframe
 		items = self.geometry_collection()
-		if len(items) > 0:
-			return min(items, key=lambda geo: geom.distance(geo))
+		if len(items) == 0:
+			return None
+
+		if isinstance(geom, mgeom.BaseGeometry):
+			projection = geom._default_pcs
+			query = geom.as_shapely(projection)
+		else:
+			projection = mgeom.pcs_for_bounds(geom.bounds)
+			query = transform_coords(geom, pyproj_transform('EPSG:4326', projection))
+
+		# the nearest feature in degrees is a seed, nothing is nearer
+		# than it in metres, so re-rank everything within that distance
+		seed = items[self._collection_index().nearest(as_wgs84(geom))]
+		radius = projected_distances([ seed ], query, projection)[0]
+		if radius == 0.0:
+			return seed
 
-		return None
+		candidates = self.inside_bbox(search_bbox(query, radius, projection))
+		if len(candidates) == 0:
+			return seed
+
+		distances = projected_distances(candidates, query, projection)
+		best = int(np.argmin(distances))
+
+		return candidates[best] if distances[best] < radius else seed
 
 	def _repr_svg_(self):
 		# Inspiration from https://github.com/shapely/shapely/blob/34136cd3104a197c3b47c97d44914197fb00879a/shapely/geometry/base.py#L263
 		# Some of the below code is licensed as shapely is
 
-		# Establish SVG canvas that will fit all the data + small space
-		total_bounds = [ obj.bounds for obj in iter(self) ]
-		total_bounds = ( min(map(lambda b: b[0], total_bounds)), min(map(lambda b: b[1], total_bounds)),
-						 max(map(lambda b: b[2], total_bounds)), max(map(lambda b: b[3], total_bounds)) )
+		# load once, reused for both the bounds and the SVG children
+		children = [ obj.as_shapely('EPSG:4326') for obj in iter(self) ]
 
-		xmin, ymin, xmax, ymax = total_bounds
+		# Establish SVG canvas that will fit all the data + small space
+		xmin, ymin, xmax, ymax = shapely.total_bounds(children)
 
 		# Expand bounds by a fraction of the data ranges
 		expand = 0.04  # or 4%, same as R plots
@@ -237,7 +530,7 @@ class Dataset:
 		view_box = f"{xmin} {ymin} {dx} {dy}"
 		transform = f"matrix(1,0,0,-1,0,{ymax + ymin})"
 
-		svg_content = ''.join(['<g transform="{0}">{1}</g>'.format(transform, child.svg(scale_factor)) for child in iter(self) ])
+		svg_content = ''.join(['<g transform="{0}">{1}</g>'.format(transform, child.svg(scale_factor)) for child in children ])
 
 		return (
 			'<svg xmlns="http://www.w3.org/2000/svg" '
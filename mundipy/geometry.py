@@ -1,5 +1,6 @@
 import json
-from functools import lru_cache, cached_property
+import math
+from functools import lru_cache
 from collections.abc import Sequence
 
 import shapely.geometry as geom
@@ -87,9 +88,18 @@ SHAPELY_METHODS = {
 	'convex_hull': TRANSFORM_INPUT | RETURN_GEO,
 	# just give straight coordinates
 	'coords': 0,
+	'x': 0,
+	'y': 0,
+	'z': 0,
+	'm': 0,
+	# parts are returned as shapely geometries
+	'exterior': 0,
+	'interiors': 0,
+	'geoms': 0,
 	# boolean ops
 	# straight line on earth != projected straight line
 	'contains': TRANSFORM_INPUT,
+	'contains_properly': TRANSFORM_INPUT,
 	'covered_by': TRANSFORM_INPUT,
 	'covers': TRANSFORM_INPUT,
 	'crosses': TRANSFORM_INPUT,
@@ -103,22 +113,27 @@ SHAPELY_METHODS = {
 	'difference': TRANSFORM_INPUT | RETURN_GEO,
 	# needs projection returns float
 	'distance': TRANSFORM_INPUT,
+	# distance in units
+	'dwithin': TRANSFORM_INPUT,
 	# bool property
 	'empty': 0,
 	# needs all
 	'envelope': TRANSFORM_INPUT | RETURN_GEO,
+	'oriented_envelope': TRANSFORM_INPUT | RETURN_GEO,
 	# none needed because pointwise
 	'equals': 0,
 	'equals_exact': 0,
 	'geom_type': 0,
 	'geometryType': 0,
 	'has_z': 0,
+	'has_m': 0,
 	# much like .distance()
 	'hausdorff_distance': TRANSFORM_INPUT,
 	# idk
 	'impl': 0,
 	# adds more points within a line, definitely needs this
 	'interpolate': TRANSFORM_INPUT | RETURN_GEO,
+	'line_interpolate_point': TRANSFORM_INPUT | RETURN_GEO,
 	# needs all
 	'intersection': TRANSFORM_INPUT | RETURN_GEO,
 	# bool unnecessary
@@ -127,6 +142,7 @@ SHAPELY_METHODS = {
 	'is_ring': 0,
 	'is_simple': 0,
 	'is_valid': 0,
+	'is_ccw': 0,
 	# projection to units
 	'length': TRANSFORM_INPUT,
 	# needs units
@@ -137,13 +153,21 @@ SHAPELY_METHODS = {
 	'normalize': 0,
 	# distance calculation
 	'project': TRANSFORM_INPUT,
+	'line_locate_point': TRANSFORM_INPUT,
 	# complex; this might be wrong
 	'relate': TRANSFORM_INPUT,
 	'relate_pattern': TRANSFORM_INPUT,
 	# does not matter as long as it's inside
 	'representative_point': 0,
+	'point_on_surface': 0,
 	# tolerance should be in units
 	'simplify': TRANSFORM_INPUT | RETURN_GEO,
+	# distances should be in units
+	'offset_curve': TRANSFORM_INPUT | RETURN_GEO,
+	'parallel_offset': TRANSFORM_INPUT | RETURN_GEO,
+	'segmentize': TRANSFORM_INPUT | RETURN_GEO,
+	# same points in reverse order
+	'reverse': 0,
 	# ??
 	'svg': 0,
 	# needs all
@@ -153,7 +177,7 @@ SHAPELY_METHODS = {
 	# needs all
 	'union': TRANSFORM_INPUT | RETURN_GEO,
 	# same as .contains
-	'within': TRANSFORM_INPUT | RETURN_GEO,
+	'within': TRANSFORM_INPUT,
 	'wkb': 0,
 	'wkb_hex': 0,
 	'wkt': 0,
@@ -161,53 +185,283 @@ SHAPELY_METHODS = {
 	'xy': 0
 }
 
-# dir() is expensive, so cache by type
-@lru_cache(maxsize=8)
-def parent_methods(parent_class):
-	return [f for f in dir(parent_class)]
+# bounds are rounded outwards to a grid of this many degrees before
+# choosing a PCS, so nearby geometries share one cached choice
+PCS_GRID = 0.1
+
+# entries are a small string each, so cells for many regions fit
+@lru_cache(maxsize=4096)
+def _pcs_for_cell(minx, miny, maxx, maxy):
+	# clamp to the WGS84 extent, as cell edges like 900 * 0.1 come out
+	# just past 90 and would fall outside every PCS area of use
+	cell = box(max(minx * PCS_GRID, -180.0), max(miny * PCS_GRID, -90.0),
+		min(maxx * PCS_GRID, 180.0), min(maxy * PCS_GRID, 90.0))
+
+	return choose_pcs(cell, units='meters')['crs']
+
+def pcs_for_bounds(bounds):
+	"""Choose a PCS in meters for (minx, miny, maxx, maxy) WGS84 bounds."""
+	minx, miny, maxx, maxy = bounds
+
+	# empty geometries have NaN bounds, which can't be gridded
+	if any(map(math.isnan, bounds)):
+		return choose_pcs(box(*bounds), units='meters')['crs']
+
+	# the grid cells contain the bounds, so any PCS containing the
+	# cells also contains the bounds
+	return _pcs_for_cell(math.floor(minx / PCS_GRID), math.floor(miny / PCS_GRID),
+		math.ceil(maxx / PCS_GRID), math.ceil(maxy / PCS_GRID))
+
+def transform_coords(geo, transformer):
+	"""Reproject a shapely geometry with one pyproj call over all of its coordinates."""
+	def np_transform(pts):
+		# pyproj can only write in place into contiguous x and y
+		# arrays, so lay them out as rows once and reuse the buffer
+		xy = np.ascontiguousarray(pts.T)
+		transformer(xy[0], xy[1], inplace=True)
+		return xy.T
+
+	return transform(geo, np_transform)
+
+# predicates with a known answer when the bounding boxes of two points
+# are disjoint
+BBOX_DISJOINT_RESULTS = {
+	'contains': False,
+	'covered_by': False,
+	'covers': False,
+	'crosses': False,
+	'disjoint': True,
+	'intersects': False,
+	'overlaps': False,
+	'touches': False,
+	'within': False
+}
+
+def bounds_disjoint(a, b):
+	return a[2] < b[0] or b[2] < a[0] or a[3] < b[1] or b[3] < a[1]
+
+def projected_property(target, attr_flags):
+	"""Wrap a shapely property to be calculated in a local projection if needed."""
+	def fget(self):
+		# default to WGS84
+		projection = 'EPSG:4326'
+		if attr_flags & TRANSFORM_INPUT:
+			# wrap in appropriate PCS
+			projection = self._default_pcs
+
+		# perform op in chosen coordinate system
+		ret = target.fget(self.as_shapely(projection))
+
+		if not attr_flags & RETURN_GEO:
+			return ret
+
+		# transform geometry out
+		return enrich_geom(ret, self.features, pcs=projection)
+
+	return property(fget, doc=target.__doc__)
+
+def projected_method(target, attr_flags):
+	"""Wrap a shapely method to be executed in a local projection if needed."""
+	disjoint_result = BBOX_DISJOINT_RESULTS.get(target.__name__)
+
+	def projection_wrapper(self, *args, **kwargs):
+		# wrapper function for any method that could require
+		# projecting to a cartesian coordinate plane
+
+		# predicates between points whose WGS84 bounding boxes don't
+		# touch can be answered without projecting anything. Edges are
+		# straight in the PCS but curved in WGS84, so other geometries
+		# can reach outside of their WGS84 bounding boxes
+		if disjoint_result is not None and len(args) > 0 and self.crs == 'EPSG:4326' and isinstance(self, (Point, MultiPoint)):
+			other = args[0]
+			if isinstance(other, (Point, MultiPoint)):
+				other_bounds = other.fast_bounds if other.crs == 'EPSG:4326' else None
+			elif isinstance(other, (geom.Point, geom.MultiPoint)):
+				other_bounds = other.bounds
+			else:
+				other_bounds = None
+
+			if other_bounds is not None and bounds_disjoint(self.fast_bounds, other_bounds):
+				return disjoint_result
+
+		# default to WGS84
+		projection = 'EPSG:4326'
+
+		# many methods require that we transform the self and other
+		# arguments to a local projection before executing the op
+		if attr_flags & TRANSFORM_INPUT:
+			# wrap in appropriate PCS
+			# get total bounds (minx, miny, maxx, maxy)
+			all_bounds = [ obj.fast_bounds for obj in args if isinstance(obj, BaseGeometry) ]
+
+			# unary ops (like buffer) reuse this geometry's PCS
+			if len(all_bounds) == 0:
+				projection = self._default_pcs
+			else:
+				minx, miny, maxx, maxy = self.fast_bounds
+				for b in all_bounds:
+					minx, miny = min(minx, b[0]), min(miny, b[1])
+					maxx, maxy = max(maxx, b[2]), max(maxy, b[3])
+
+				projection = pcs_for_bounds((minx, miny, maxx, maxy))
+
+		# convert to projections and raw shapely objects in one pass
+		# pass through if floats, other types, etc
+		# geometries already in the projection skip as_shapely entirely
+		custom_args = [ self._geo if self.crs == projection else self.as_shapely(projection) ]
+		for x in args:
+			if isinstance(x, BaseGeometry):
+				x = x._geo if x.crs == projection else x.as_shapely(projection)
+			elif projection != 'EPSG:4326' and isinstance(x, geom.base.BaseGeometry):
+				# shapely arguments are taken to be in WGS84, the
+				# transformer is only looked up when one is passed
+				x = transform_coords(x, pyproj_transform('EPSG:4326', projection))
+
+			custom_args.append(x)
+
+		# if we don't return a geometric object, we immediately
+		# execute and return
+		if not attr_flags & RETURN_GEO:
+			# performing operations on invalid geometries can
+			# throw GEOSException, but .make_valid is expensive.
+			# We lazily repair invalid geometries upon error
+			try:
+				return target(*custom_args, **kwargs)
+			except GEOSException:
+				# make_valid repairs invalid geometries
+				repaired_args = [ make_valid(x) if isinstance(x, geom.base.BaseGeometry) else x for x in custom_args ]
+
+				return target(*repaired_args, **kwargs)
+
+		try:
+			# If we do return a geometry, there's a chance we need to
+			# reproject into the geographic coordinate system, but also
+			# a chance that we want to keep in the local projection.
+			# Because of this, we create the geometry from local, and
+			# will lazily transform to geographic if needed.
+			ret = target(*custom_args, **kwargs)
+			return enrich_geom(ret, self.features, pcs=projection)
+		except GEOSException:
+			repaired_args = [ make_valid(x) if isinstance(x, geom.base.BaseGeometry) else x for x in custom_args ]
+
+			ret = target(*repaired_args, **kwargs)
+			return enrich_geom(ret, self.features, pcs=projection)
+
+	projection_wrapper.__name__ = target.__name__
+	projection_wrapper.__doc__ = target.__doc__
+
+	return projection_wrapper
+
+class FeatureBatch():
+	"""
+	Feature properties for many geometries stored by column, as
+	{ name: [value, ...] }. Geometries created by enrich_batch read
+	from the batch and only build a features dict when it is requested.
+	"""
+
+	__slots__ = ('columns',)
+
+	def __init__(self, columns: dict):
+		self.columns = columns
+
+	def row(self, idx):
+		return { name: values[idx] for name, values in self.columns.items() }
 
 class BaseGeometry():
 
+	# there can be many geometries, so internal state lives in slots.
+	# __dict__ is only allocated if a user sets their own attribute
+	__slots__ = ('_features', '_batch', '_row', 'crs', '_geo', '_geo_fn', '_fast_bounds', '_pcs', '_reprojected',
+		'__dict__', '__weakref__')
+
 	parent_class = None
 
 	def __init__(self, geo, crs: str, features: dict):
-		self.features = features
+		self._features = features
+		# set by enrich_batch, features are then read from the batch
+		self._batch = None
+		self._row = None
 		self.crs = crs
+		# computed lazily by fast_bounds, _default_pcs and as_shapely
+		self._fast_bounds = None
+		self._pcs = None
+		self._reprojected = None
 		# either a function generating a shapely.geometry, or a value
 		# if the value is a sequence, pass it to the constructor
+		# a function is called on first access of _geo, after which
+		# _geo is a plain slot read
+		self._geo_fn = None
 		if isinstance(geo, Sequence):
-			self._geo_val = self.parent_class(geo)
+			self._geo = self.parent_class(geo)
+		elif callable(geo):
+			self._geo_fn = geo
 		else:
-			self._geo_val = geo
+			self._geo = geo
 
-	@property
-	def _geo(self):
-		if callable(self._geo_val):
-			self._geo_val = self._geo_val()
+	def __getattr__(self, name):
+		# only reached for unset slots, i.e. a lazy _geo not yet generated
+		if name == '_geo' and self._geo_fn is not None:
+			self._geo = self._geo_fn()
+			self._geo_fn = None
+
+			return self._geo
 
-		return self._geo_val
+		raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
 
-	@lru_cache(maxsize=4)
 	def as_shapely(self, to_crs):
 		""" Take the geometry as a shapely object in a coordinate system. """
 		if to_crs == self.crs:
 			return self._geo
 
-		transformer = pyproj_transform(self.crs, to_crs)
-		def np_transform(pts):
-			fx, fy = transformer(pts[:, 0], pts[:, 1])
-			return np.dstack([fx, fy])[0]
+		# reprojections are cached per geometry, and die with it
+		if self._reprojected is None:
+			self._reprojected = dict()
+
+		reprojected = self._reprojected.get(to_crs)
+		if reprojected is None:
+			reprojected = transform_coords(self._geo, pyproj_transform(self.crs, to_crs))
+			self._reprojected[to_crs] = reprojected
+
+		return reprojected
+
+	@property
+	def features(self):
+		if self._features is None and self._batch is not None:
+			self._features = self._batch.row(self._row)
 
-		return transform(self._geo, np_transform)
+		return self._features
+
+	@features.setter
+	def features(self, features):
+		self._features = features
+		self._batch = None
 
 	def __getitem__(self, item):
-		return self.features[item]
+		# read straight from the batch until a dict is built
+		if self._features is None and self._batch is not None:
+			return self._batch.columns[item][self._row]
+
+		return self._features[item]
 
 	def __setitem__(self, item, value):
 		self.features[item] = value
 
-	@cached_property
+	@property
 	def fast_bounds(self):
+		if self._fast_bounds is None:
+			self._fast_bounds = self._calculate_fast_bounds()
+
+		return self._fast_bounds
+
+	@property
+	def _default_pcs(self):
+		"""The PCS used for projected operations on this geometry alone."""
+		if self._pcs is None:
+			self._pcs = pcs_for_bounds(self.fast_bounds)
+
+		return self._pcs
+
+	def _calculate_fast_bounds(self):
 		# because PCS (traditionally) use northing and easting
 		# as positive and this matches with EPSG:4326 generally,
 		# let's use this to calculate fast bounds for PCS finding
@@ -237,94 +491,34 @@ class BaseGeometry():
 			'properties': self.features
 		}
 
-	def __getattr__(self, name):
-		if name not in parent_methods(self.parent_class):
-			raise AttributeError('"%s" has no attribute "%s"' % (str(type(self)), name))
-
-		target = getattr(self.parent_class, name)
-
-		# bind to self if callable
-		if isinstance(target, property):
-			# some properties are calculated in a local projection
-			attr_flags = SHAPELY_METHODS[name] if name in SHAPELY_METHODS else 0
-
-			# default to WGS84
-			projection = 'EPSG:4326'
-			if attr_flags & TRANSFORM_INPUT:
-				# wrap in appropriate PCS
-				projection = choose_pcs(box(*self.fast_bounds), units='meters')['crs']
-
-			# perform op in chosen coordinate system
-			ret = target.fget(self.as_shapely(projection))
-
-			if not attr_flags & RETURN_GEO:
-				return ret
-
-			# transform geometry out
-			return enrich_geom(ret, self.features, pcs=projection)
-
-		elif callable(target):
-			# get attribute flags
+	def __init_subclass__(cls, **kwargs):
+		super().__init_subclass__(**kwargs)
+
+		# Bind the parent class's properties and methods onto the class
+		# once, instead of resolving them on every attribute access.
+		# Names already defined, including all dunders, are left alone,
+		# as are names without known flags: computing them in WGS84
+		# could silently give results in degrees.
+		for name in dir(cls.parent_class):
+			if name.startswith('__') or hasattr(cls, name) or name not in SHAPELY_METHODS:
+				continue
+
+			target = getattr(cls.parent_class, name)
+			# flags are resolved here once and captured by the wrapper,
+			# SHAPELY_METHODS is never consulted per call
 			attr_flags = SHAPELY_METHODS[name]
 
-			def projection_wrapper(*args, **kwargs):
-				# wrapper function for any method that could require
-				# projecting to a cartesian coordinate plane
-				custom_args = [self, *args]
-
-				# many methods require that we transform the self and other
-				# arguments to a local projection before executing the op
-				if attr_flags & TRANSFORM_INPUT:
-					# wrap in appropriate PCS
-					# get total bounds (minx, miny, maxx, maxy)
-					total_bounds = [ obj.fast_bounds for obj in args if isinstance(obj, BaseGeometry) ] + [ self.fast_bounds ]
-					total_bounds = ( min(map(lambda b: b[0], total_bounds)), min(map(lambda b: b[1], total_bounds)),
-									 max(map(lambda b: b[2], total_bounds)), max(map(lambda b: b[3], total_bounds)) )
-
-					projection = choose_pcs(box(*total_bounds), units='meters')['crs']
-
-					# convert to projections and raw shapely objects
-					# pass through if floats, other types, etc
-					# beware of double projecting, which is why we do shapely first, then mundipy geometries
-					transformer = pyproj_transform('EPSG:4326', projection)
-					custom_args = [ transform(transformer, x) if isinstance(x, geom.base.BaseGeometry) else x for x in custom_args ]
-
-					custom_args = [ x.as_shapely(projection) if isinstance(x, BaseGeometry) else x for x in custom_args ]
-
-				# if we don't return a geometric object, we immediately
-				# execute and return
-				if not attr_flags & RETURN_GEO:
-					# performing operations on invalid geometries can
-					# throw GEOSException, but .make_valid is expensive.
-					# We lazily repair invalid geometries upon error
-					try:
-						return target(*custom_args, **kwargs)
-					except GEOSException:
-						# make_valid repairs invalid geometries
-						repaired_args = [ make_valid(x) if isinstance(x, geom.base.BaseGeometry) else x for x in custom_args ]
-
-						return target(*repaired_args, **kwargs)
-
-				try:
-					# If we do return a geometry, there's a chance we need to
-					# reproject into the geographic coordinate system, but also
-					# a chance that we want to keep in the local projection.
-					# Because of this, we create the geometry from local, and
-					# will lazily transform to geographic if needed.
-					ret = target(*custom_args, **kwargs)
-					return enrich_geom(ret, self.features, pcs=projection)
-				except GEOSException:
-					repaired_args = [ make_valid(x) if isinstance(x, geom.base.BaseGeometry) else x for x in custom_args ]
-
-					ret = target(*repaired_args, **kwargs)
-					return enrich_geom(ret, self.features, pcs=projection)
-
-			return projection_wrapper
-		else:
-			return target
+			if isinstance(target, property):
+				setattr(cls, name, projected_property(target, attr_flags))
+			elif callable(target):
+				setattr(cls, name, projected_method(target, attr_flags))
+			else:
+				setattr(cls, name, target)
 
 class Point(BaseGeometry):
 
+	__slots__ = ()
+
 	parent_class = geom.Point
 
 	def __init__(self, geo: geom.Point, crs: str, features: dict):
@@ -332,6 +526,8 @@ class Point(BaseGeometry):
 
 class MultiPoint(BaseGeometry):
 
+	__slots__ = ()
+
 	parent_class = geom.MultiPoint
 
 	def __init__(self, geo: geom.MultiPoint, crs: str, features: dict):
@@ -339,6 +535,8 @@ class MultiPoint(BaseGeometry):
 
 class LineString(BaseGeometry):
 
+	__slots__ = ()
+
 	parent_class = geom.LineString
 
 	def __init__(self, geo: geom.LineString, crs: str, features: dict):
@@ -346,6 +544,8 @@ class LineString(BaseGeometry):
 
 class MultiLineString(BaseGeometry):
 
+	__slots__ = ()
+
 	parent_class = geom.MultiLineString
 
 	def __init__(self, geo: geom.MultiLineString, crs: str, features: dict):
@@ -353,6 +553,8 @@ class MultiLineString(BaseGeometry):
 
 class Polygon(BaseGeometry):
 
+	__slots__ = ()
+
 	parent_class = geom.Polygon
 
 	def __init__(self, geo: geom.Polygon, crs: str, features: dict):
@@ -360,6 +562,8 @@ class Polygon(BaseGeometry):
 
 class MultiPolygon(BaseGeometry):
 
+	__slots__ = ()
+
 	parent_class = geom.MultiPolygon
 
 	def __init__(self, geo: geom.MultiPolygon, crs: str, features: dict):
@@ -367,30 +571,44 @@ class MultiPolygon(BaseGeometry):
 
 class GeometryCollection(BaseGeometry):
 
+	__slots__ = ()
+
 	parent_class = geom.GeometryCollection
 
 	def __init__(self, geo: geom.GeometryCollection, crs: str, features: dict):
 		super().__init__(geo, crs, features)
 
+# shapely type -> mundipy class, for enrich_geom
+GEOMETRY_CLASSES = {
+	geom.Point: Point,
+	geom.MultiPoint: MultiPoint,
+	geom.LineString: LineString,
+	geom.MultiLineString: MultiLineString,
+	geom.Polygon: Polygon,
+	geom.MultiPolygon: MultiPolygon,
+	geom.GeometryCollection: GeometryCollection
+}
+
 def enrich_geom(geo, features, pcs='EPSG:4326'):
 	"""Enrich a shapely geometry with old features"""
-	if isinstance(geo, geom.Point):
-		return Point(geo, pcs, features)
-	elif isinstance(geo, geom.MultiPoint):
-		return MultiPoint(geo, pcs, features)
-	elif isinstance(geo, geom.LineString):
-		return LineString(geo, pcs, features)
-	elif isinstance(geo, geom.MultiLineString):
-		return MultiLineString(geo, pcs, features)
-	elif isinstance(geo, geom.Polygon):
-		return Polygon(geo, pcs, features)
-	elif isinstance(geo, geom.MultiPolygon):
-		return MultiPolygon(geo, pcs, features)
-	elif isinstance(geo, geom.GeometryCollection):
-		return GeometryCollection(geo, pcs, features)
-	else:
+	cls = GEOMETRY_CLASSES.get(type(geo))
+	if cls is None:
 		raise TypeError('enrich_geom got unsupported type %s' % str(type(geo)))
 
+	return cls(geo, pcs, features)
+
+def enrich_batch(geos, batch: FeatureBatch, pcs='EPSG:4326'):
+	"""Enrich a sequence of shapely geometries with columnar features"""
+	out = []
+	for idx, geo in enumerate(geos):
+		enriched = enrich_geom(geo, None, pcs=pcs)
+		enriched._batch = batch
+		enriched._row = idx
+
+		out.append(enriched)
+
+	return out
+
 def loads(obj):
 	if 'type' not in obj or obj['type'] != 'FeatureCollection':
 		raise ValueError('mundipy.geometry.loads expects type=FeatureCollection')
@@ -7,6 +7,8 @@ from contextvars import copy_context
 from contextlib import redirect_stdout
 
 import fiona
+import numpy as np
+import shapely
 from tqdm import tqdm
 from shapely.ops import transform
 from shapely.geometry import Polygon, MultiPolygon, LineString, Point, box
@@ -21,6 +23,22 @@ from mundipy.geometry import enrich_geom
 import mundipy.geometry as geom
 from mundipy.utils import _plot
 
+# shapely.get_type_id() of Polygon and MultiPolygon
+POLYGONAL_TYPE_IDS = (3, 6)
+
+def process_datasets(fn, mapdata):
+    """The datasets requested by name in the arguments of a process fn."""
+    args = inspect.getfullargspec(fn)[0][1:]
+
+    df_args = []
+    for arg in args:
+        try:
+            df_args.append(mapdata.collections[arg])
+        except KeyError:
+            raise TypeError('mundi process() function requests dataset \'%s\', but no dataset was defined on Mundi' % arg)
+
+    return df_args
+
 class MundiQ:
     def __init__(self, center, mapdata, units='meters'):
         # a shapely object in EPSG:4326
@@ -32,16 +50,10 @@ class MundiQ:
         # list of shapely features
         self.plot_contents = []
 
-    def call_process(self, fn):
+    def call_process(self, fn, df_args=None):
         # pass dataset as dataframe if requested
-        args = inspect.getfullargspec(fn)[0][1:]
-
-        df_args = []
-        for arg in args:
-            try:
-                df_args.append(self.mapdata.collections[arg])
-            except KeyError:
-                raise TypeError('mundi process() function requests dataset \'%s\', but no dataset was defined on Mundi' % arg)
+        if df_args is None:
+            df_args = process_datasets(fn, self.mapdata)
 
         # call fn with a relevant context
         ctx = copy_context()
@@ -54,22 +66,31 @@ class MundiQ:
         Plot a shape in the current MundiQ context. Shape can be
         a list of mundipy geometries or a single mundipy geometry.
         """
+        shapes = []
+        self._flatten_shapes(shape, shapes)
+        if len(shapes) == 0:
+            return
+
+        # fix shapes, buffering all polygons in one vectorized call
+        shapes = np.array(shapes, dtype=object)
+        polygonal = np.isin(shapely.get_type_id(shapes), POLYGONAL_TYPE_IDS)
+        shapes[polygonal] = shapely.buffer(shapes[polygonal], 0)
+
+        # plot_contents can only contain shapely geometries
+        self.plot_contents.extend(shapes)
+
+    def _flatten_shapes(self, shape, out):
+        """Collect shapely geometries in EPSG:4326 from a (nested) list of mundipy geometries."""
         if isinstance(shape, list):
             for single_shape in shape:
-                self.plot(single_shape, name)
+                self._flatten_shapes(single_shape, out)
 
             return
 
         if not isinstance(shape, geom.BaseGeometry):
             raise TypeError('mundipy.plot() requires mundipy BaseGeometry but got "%s"' % type(shape))
 
-        # fix shapes
-        shape = shape.as_shapely('EPSG:4326')
-        if isinstance(shape, Polygon) or isinstance(shape, MultiPolygon):
-            shape = shape.buffer(0)
-
-        # plot_contents can only contain shapely geometries
-        self.plot_contents.append(shape)
+        out.append(shape.as_shapely('EPSG:4326'))
 
 class Mundi:
     def __init__(self, mapdata, main: str, units='meters'):
@@ -120,20 +141,30 @@ class Mundi:
         res_shapely_col = 'geometry'
         # list of mundipy geometries
         res_outs = []
-        # progressbar optional
-        finiter = list(enumerate(unique_iterator))[n_start:n_end]
+        # the same datasets are passed to every call, looked up on
+        # the first call so there is no lookup when there are no rows
+        df_args = None
+
+        # slice indices, rather than pairing up every feature
+        # of the collection only to keep some of them
+        indices = range(len(unique_iterator))[n_start:n_end]
+        finiter = ((idx, unique_iterator[idx]) for idx in indices)
 
+        # progressbar optional
         if progressbar:
-            finiter = tqdm(finiter, total=len(finiter))
+            finiter = tqdm(finiter, total=len(indices))
 
         for idx, original_shape in finiter:
             # TODO fn(Q) can edit window
 
             Q = MundiQ(original_shape, self.mapdata)
 
+            if df_args is None:
+                df_args = process_datasets(fn, self.mapdata)
+
             # capture stdout
             with redirect_stdout(io.StringIO()) as f:
-                res = Q.call_process(fn)
+                res = Q.call_process(fn, df_args)
 
             # if res is None, skip
             if res is None:
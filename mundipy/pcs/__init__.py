@@ -45,7 +45,13 @@ def choose_pcs(box, units='meters'):
 		suggestions = []
 
 		for potential_pcs in by_area:
-			geo = shape(potential_pcs['geometry']).buffer(0)
+			geo = shape(potential_pcs['geometry'])
+			# buffer(0) is a full GEOS union, so only repair areas
+			# whose envelope could contain the box at all
+			if not envelope_contains(geo, box):
+				continue
+
+			geo = geo.buffer(0)
 			if not geo.contains(box):
 				continue
 
@@ -82,7 +88,8 @@ def suggest_pcs(box, units='meters', n=3):
 		suggestions = []
 
 		for potential_pcs in by_area:
-			if not shape(potential_pcs['geometry']).buffer(0).contains(box):
+			geo = shape(potential_pcs['geometry'])
+			if not envelope_contains(geo, box) or not geo.buffer(0).contains(box):
 				continue
 
 			suggestions.append(potential_pcs)
@@ -92,6 +99,13 @@ def suggest_pcs(box, units='meters', n=3):
 
 		return list(map(transform_epsg, suggestions))
 
+def envelope_contains(geo, box):
+	"""Whether the bounds of geo contain the bounds of box."""
+	minx, miny, maxx, maxy = geo.bounds
+	bminx, bminy, bmaxx, bmaxy = box.bounds
+
+	return minx <= bminx and miny <= bminy and maxx >= bmaxx and maxy >= bmaxy
+
 def transform_epsg(geojson):
 	return {
 		'name': geojson['properties']['name'],
@@ -1,8 +1,11 @@
 
 from mundipy.pcs import choose_pcs
-from mundipy.cache import spatial_cache_footprint, union_spatial_cache
+from mundipy.cache import spatial_cache_footprint, union_spatial_cache, pyproj_transform
 from shapely.geometry import box, Point
+from mundipy.dataset import Dataset
 import random
+import weakref
+import gc
 
 def test_cache_choose():
     bbox = (-118.843683, 34.052235, -118.143683, 34.552235)
@@ -20,4 +23,68 @@ def test_cache_none():
 
     assert fn(box(-118.843683, 34.052235, -118.143683, 34.552235)) == None
 
-# TODO put test_union_cache here
+def test_union_cache():
+    calls = []
+
+    @union_spatial_cache
+    def fn(geom):
+        calls.append(geom)
+        return [ Point(x + 0.5, y + 0.5) for x in range(4) for y in range(4) if geom.intersects(Point(x + 0.5, y + 0.5)) ]
+
+    assert len(fn(box(0, 0, 2, 2))) == 4
+    assert len(calls) == 1
+
+    # fully inside the cached footprint, no call needed
+    assert len(fn(box(0, 0, 1, 1))) == 1
+    assert len(calls) == 1
+
+    # half cached, function only called on the remaining area
+    assert len(fn(box(0, 0, 4, 2))) == 8
+    assert len(calls) == 2
+    assert calls[1].equals(box(2, 0, 4, 2))
+
+def test_union_cache_duplicates():
+    # one feature straddles the edge between the two loaded areas
+    features = [ box(0.5, 0.5, 1.5, 1.5), box(1.5, 0, 2, 1) ]
+
+    @union_spatial_cache
+    def fn(geom):
+        return [ f for f in features if geom.intersects(f) ]
+
+    assert len(fn(box(0, 0, 1, 1))) == 1
+    assert len(fn(box(0, 0, 2, 1))) == 2
+
+    # the remaining area is cached with its own result
+    assert len(fn(box(1, 0, 2, 1))) == 2
+
+def test_union_cache_releases_instance():
+    df = Dataset('tests/fixtures/la_coffeeshops.geojson')
+    assert len(df.inside_bbox((-118.5, 34.0, -118.3, 34.2))) > 0
+
+    ref = weakref.ref(df)
+    del df
+    gc.collect()
+
+    assert ref() is None
+
+def test_cache_lru():
+    def fn(arg):
+        return (arg.bounds, arg.buffer(1.0))
+
+    cached = spatial_cache_footprint(fn, maxsize=2)
+
+    cached(Point(0, 0))
+    cached(Point(10, 10))
+    # hit refreshes the first footprint
+    cached(Point(0, 0))
+    # evicts the least recently used, (10, 10)
+    cached(Point(20, 20))
+
+    assert cached.cache_info == { 'hits': 1, 'misses': 3 }
+
+    cached(Point(0, 0))
+    cached(Point(10, 10))
+    assert cached.cache_info == { 'hits': 2, 'misses': 4 }
+
+def test_pyproj_transform_keys():
+    assert pyproj_transform(4326, 3857) is pyproj_transform('EPSG:4326', 'epsg:3857')
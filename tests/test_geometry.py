@@ -1,5 +1,6 @@
 import pytest
 import json
+import weakref
 
 from mundipy.dataset import Dataset
 from mundipy.geometry import enrich_geom, Point, MultiPolygon, MultiLineString, MultiPoint, loads, dumps
@@ -130,3 +131,205 @@ def test_loads_dumps():
         assert len(res[0].exterior.coords) == 6
 
     assert json.dumps(dumps(res)) == '{"type": "FeatureCollection", "features": [{"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [[[-125.859375, 49.03786794532644], [-125.5078125, 30.600093873550072], [-83.14453125, 27.994401411046148], [-81.2109375, 42.68243539838623], [-92.46093749999999, 49.15296965617042], [-125.859375, 49.03786794532644]]]}, "properties": {"name": "example_property"}}]}'
+
+def test_nearest():
+    df = Dataset('tests/fixtures/points.geojson')
+
+    # near Durham, NC
+    nearest = df.nearest(Point((-78.9, 36.0), 'EPSG:4326', dict()))
+    assert nearest.coords[0] == pytest.approx((-78.92578124999999, 35.88905007936091))
+
+    # shapely geometries are assumed WGS84
+    nearest = df.nearest(shapely.geometry.Point(-110.0, 37.0))
+    assert nearest.coords[0] == pytest.approx((-111.62109375, 37.020098201368114))
+
+def test_nearest_high_latitude():
+    df = Dataset('tests/fixtures/high_latitude.geojson')
+
+    # (0, 60.5) is nearer in degrees, but (0.9, 60) is ~50km away
+    # and (0, 60.5) is ~56km away
+    assert df.nearest(Point((0.0, 60.0), 'EPSG:4326', dict()))['name'] == 'east'
+    assert df.nearest(shapely.geometry.Point(0.0, 60.0))['name'] == 'east'
+
+def test_dataset_context():
+    with Dataset('tests/fixtures/points.geojson') as df:
+        assert len(df) == 3
+        assert len(list(df)) == 3
+
+    assert df._fiona_collections == []
+    assert df._collection is None
+
+def test_enrich_batch():
+    batch = geom.FeatureBatch({ 'name': ['a', 'b'], 'n': [1, 2] })
+    res = geom.enrich_batch([shapely.geometry.Point(0, 0), shapely.geometry.Point(1, 1)], batch)
+
+    assert isinstance(res[1], Point)
+    assert res[1]['name'] == 'b'
+    assert res[0].features == { 'name': 'a', 'n': 1 }
+
+    res[1]['n'] = 3
+    assert res[1].features == { 'name': 'b', 'n': 3 }
+    # the batch itself is unchanged
+    assert batch.columns['n'] == [1, 2]
+
+def test_shapely_argument():
+    pt = enrich_geom(shapely.geometry.Point(-118.3, 34.1), dict())
+
+    # shapely arguments are taken to be WGS84
+    assert pt.intersects(shapely.geometry.Point(-118.3, 34.1).buffer(0.01))
+    assert not pt.intersects(shapely.geometry.Point(-118.4, 34.1).buffer(0.01))
+
+def test_inside_bbox_projected():
+    df = Dataset('tests/fixtures/la_coffeeshops.geojson')
+
+    wgs84 = df.inside_bbox(df.bounds)
+    projected = df.inside_bbox_projected(df.bounds, 'EPSG:32611')
+
+    assert len(projected) == len(wgs84) == 12
+    assert projected[0].crs == 'EPSG:32611'
+    assert projected[0]['name'] == wgs84[0]['name']
+    assert projected[0].as_shapely('EPSG:4326').coords[0] == pytest.approx(wgs84[0].coords[0])
+
+def test_inside_bbox_projected_bounds():
+    df = Dataset('tests/fixtures/polygon.geojson')
+
+    projected = df.inside_bbox_projected(df.bounds, 'EPSG:5070')
+
+    assert projected[0].fast_bounds == pytest.approx(df.bounds)
+
+def test_disjoint_predicates():
+    pt = enrich_geom(shapely.geometry.Point(0.5, 0.5), dict())
+    inside = enrich_geom(shapely.geometry.box(0, 0, 1, 1), dict())
+    outside = enrich_geom(shapely.geometry.box(2, 2, 3, 3), dict())
+
+    assert pt.within(inside)
+    assert inside.contains(pt)
+    assert not pt.within(outside)
+    assert not outside.contains(pt)
+    assert not pt.intersects(outside)
+    assert pt.disjoint(outside)
+    assert not pt.intersects(shapely.geometry.box(2, 2, 3, 3))
+
+    other = enrich_geom(shapely.geometry.Point(2.5, 2.5), dict())
+    assert not pt.intersects(other)
+    assert pt.disjoint(other)
+
+    # the top edge is straight in the PCS, so bulges north of the
+    # WGS84 bounding box
+    area = enrich_geom(shapely.geometry.box(-119.5, 34.0, -117.5, 34.5), dict())
+    assert area.contains(Point((-118.5, 34.501), 'EPSG:4326', dict()))
+
+def test_projected_line_methods():
+    line = enrich_geom(shapely.geometry.LineString([(0, 60), (0.9, 60)]), dict())
+    pt = Point((0.9, 60), 'EPSG:4326', dict())
+
+    # ~50km, in meters rather than degrees
+    assert line.length == pytest.approx(50200, rel=1e-2)
+    assert line.line_locate_point(pt) == pytest.approx(line.length)
+
+    # private shapely names have no known flags and are not bound
+    with pytest.raises(AttributeError):
+        line._line_interpolate_point
+
+def test_geometry_attributes():
+    pt = Point((0.5, 0.5), 'EPSG:4326', dict())
+
+    # like shapely geometries, mundipy geometries can be weakly referenced
+    ref = weakref.ref(pt)
+    assert ref() is pt
+
+    # and hold arbitrary attributes
+    pt.note = 1
+    assert pt.note == 1
+
+def test_inside_bbox_in_memory():
+    bbox = (-118.5, 34.0, -118.3, 34.2)
+
+    from_file = Dataset('tests/fixtures/la_coffeeshops.geojson').inside_bbox(bbox)
+
+    df = Dataset('tests/fixtures/la_coffeeshops.geojson')
+    assert len(list(df)) == 12
+    from_memory = df.inside_bbox(bbox)
+
+    assert len(from_memory) > 0
+    assert [ f['name'] for f in from_memory ] == [ f['name'] for f in from_file ]
+
+def test_dataset_within():
+    shops = list(Dataset('tests/fixtures/la_coffeeshops.geojson'))
+
+    for radius in [100, 1000, 5000]:
+        df = Dataset('tests/fixtures/los-angeles.geojson')
+        within = df.within(radius, shops[0])
+
+        df = Dataset('tests/fixtures/los-angeles.geojson')
+        buffered = df.intersects(shops[0].buffer(radius))
+
+        assert sorted(f['name'] for f in within) == sorted(f['name'] for f in buffered)
+
+    assert len(Dataset('tests/fixtures/los-angeles.geojson').within(5000, shops[0])) > 1
+
+def test_pyogrio_matches_fiona(monkeypatch):
+    pytest.importorskip('pyogrio')
+    import mundipy.dataset
+
+    for filename in ['points', 'polygon', 'multilinestring', 'los-angeles', 'properties']:
+        filename = 'tests/fixtures/%s.geojson' % filename
+
+        with_pyogrio = list(Dataset(filename))
+        with monkeypatch.context() as m:
+            m.setattr(mundipy.dataset, 'pyogrio', None)
+            with_fiona = list(Dataset(filename))
+
+        assert len(with_pyogrio) == len(with_fiona)
+        for a, b in zip(with_pyogrio, with_fiona):
+            assert a.features == b.features
+            assert a.as_shapely('EPSG:4326').equals(b.as_shapely('EPSG:4326'))
+
+def test_dataset_pool_failure(monkeypatch):
+    import mundipy.dataset
+
+    pools = []
+    class UnreachablePool():
+        def __init__(self, *args, **kwargs):
+            self.closed = False
+            pools.append(self)
+
+        def wait(self, timeout):
+            raise mundipy.dataset.psycopg.OperationalError('unreachable')
+
+        def close(self, timeout=5.0):
+            self.closed = True
+
+    monkeypatch.setattr(mundipy.dataset, 'ConnectionPool', UnreachablePool)
+
+    df = Dataset({ 'url': 'postgresql://localhost/none', 'table': 'none' })
+    with pytest.raises(mundipy.dataset.psycopg.OperationalError):
+        df._get_pool()
+
+    # the failed pool is closed, not kept for the next load
+    assert pools[0].closed
+    assert df._pool is None
+
+    # __del__ never raises, even on a partly constructed Dataset
+    Dataset.__new__(Dataset).__del__()
+
+def test_pcs_for_bounds_edges():
+    from mundipy.pcs import choose_pcs
+
+    # grid cells at the poles and antimeridian stay inside WGS84 bounds,
+    # even though 900 * 0.1 is just over 90
+    for bounds in [(179.95, 89.95, 180.0, 90.0), (-180.0, -90.0, -179.95, -89.95), (-180.0, -90.0, 180.0, 90.0)]:
+        assert geom.pcs_for_bounds(bounds) == choose_pcs(shapely.geometry.box(*bounds), units='meters')['crs']
+
+def test_dataset_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    df = Dataset('tests/fixtures/la_coffeeshops.geojson')
+    expected = len(df)
+
+    # each thread reads through its own fiona collection
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        assert list(pool.map(lambda _: len(df), range(16))) == [expected] * 16
+
+    df.close()
+    assert df._fiona_collections == []
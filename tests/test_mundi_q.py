@@ -36,6 +36,18 @@ def test_mundi_q_n():
 
     assert len(outs['features']) == 1
 
+def test_mundi_q_no_rows():
+    mundi = Mundi(Map({
+        'points': 'tests/fixtures/points.geojson',
+        }), 'points', units='feet')
+
+    def process(point, not_in_mundi):
+        return point
+
+    # datasets are only looked up once there is a row to process
+    with pytest.raises(ValueError, match='all results from mundi.q'):
+        mundi.q(process, n_start=0, n_end=0)
+
 def test_mundi_q_badcolumn():
     mundi = Mundi(Map({
         'points': 'tests/fixtures/points.geojson',
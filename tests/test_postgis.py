@@ -0,0 +1,44 @@
+import os
+import uuid
+import pytest
+import psycopg
+
+from mundipy.dataset import Dataset
+
+# e.g. postgresql://postgres@localhost:5432/postgres, with PostGIS installed
+POSTGIS_URL = os.environ.get('MUNDIPY_TEST_POSTGIS')
+
+pytestmark = pytest.mark.skipif(POSTGIS_URL is None, reason='MUNDIPY_TEST_POSTGIS not set')
+
+@pytest.fixture
+def enum_table():
+    table = 'mundipy_test_%s' % uuid.uuid4().hex[:8]
+
+    with psycopg.connect(POSTGIS_URL, autocommit=True) as conn:
+        conn.execute("CREATE TYPE %s_kind AS ENUM ('cafe', 'park')" % table)
+        conn.execute("CREATE TABLE %s (name text, kind %s_kind, geometry geometry(Point, 4326))" % (table, table))
+        conn.execute("INSERT INTO %s VALUES ('a', 'cafe', ST_SetSRID(ST_MakePoint(-118.4, 34.1), 4326))" % table)
+
+    yield table
+
+    with psycopg.connect(POSTGIS_URL, autocommit=True) as conn:
+        conn.execute("DROP TABLE %s" % table)
+        conn.execute("DROP TYPE %s_kind" % table)
+
+def test_postgis_column_types(enum_table):
+    with Dataset({ 'url': POSTGIS_URL, 'table': enum_table }) as df:
+        feats = df.inside_bbox((-119.0, 34.0, -118.0, 35.0))
+
+        assert len(feats) == 1
+        # enums have no binary loader, but should still load as str
+        assert feats[0]['kind'] == 'cafe'
+        assert feats[0]['name'] == 'a'
+        assert feats[0].coords[0] == pytest.approx((-118.4, 34.1))
+
+def test_postgis_stream_column_types(enum_table):
+    # loading everything streams through a server-side cursor
+    with Dataset({ 'url': POSTGIS_URL, 'table': enum_table }) as df:
+        feats = list(df)
+
+        assert len(feats) == 1
+        assert feats[0]['kind'] == 'cafe'
@@ -1,6 +1,9 @@
 import pytest
+import json
 
-from mundipy.api import isochrone
+import mundipy.api
+
+from mundipy.api import isochrone, isochrones
 from mundipy.geometry import Point
 
 def test_isochrone():
@@ -10,3 +13,48 @@ def test_isochrone():
         isochrone(False, 30., 'meters', accessToken='test')
     with pytest.raises(TypeError, match='unknown unit "feet" passed'):
         isochrone(Point((0, 0), 'EPSG:4326', dict()), 30., 'feet', accessToken='test')
+
+def test_isochrone_path(monkeypatch):
+    paths = []
+
+    def mapbox_get(path, params):
+        paths.append(path)
+        return json.dumps({
+            'type': 'FeatureCollection',
+            'features': [{ 'type': 'Feature', 'properties': {}, 'geometry': { 'type': 'Point', 'coordinates': [0, 0] } }]
+        }).encode('utf-8')
+
+    monkeypatch.setattr(mundipy.api, '_mapbox_get', mapbox_get)
+
+    isochrone(Point((-118.123456789, 1e-5), 'EPSG:4326', dict()), 10., 'minutes', accessToken='test')
+    assert paths == ['/isochrone/v1/mapbox/driving/-118.12345679%2C0.00001000']
+
+def test_isochrones():
+    with pytest.raises(TypeError, match='expects max_workers to be a positive int'):
+        isochrones([], 30., 'meters', accessToken='test', max_workers=0)
+    with pytest.raises(ValueError, match='called without Mapbox accessToken'):
+        isochrones([Point((0, 0), 'EPSG:4326', dict())], 50., 'minutes')
+
+    assert isochrones([], 30., 'meters', accessToken='test') == []
+
+def test_mapbox_throttle(monkeypatch):
+    clock = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(mundipy.api, 'MAPBOX_RATE_LIMIT', 2)
+    monkeypatch.setattr(mundipy.api, '_request_times', mundipy.api.deque())
+    monkeypatch.setattr(mundipy.api.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(mundipy.api.time, 'sleep', sleep)
+
+    mundipy.api._throttle()
+    clock[0] += 10.0
+    mundipy.api._throttle()
+    assert sleeps == []
+
+    # third request waits until the first leaves the window
+    mundipy.api._throttle()
+    assert sleeps == [50.0]